@@ -1,20 +1,70 @@
+import asyncio
+import glob
+import itertools
 import json
-import requests
+import orjson
+import ahocorasick
+import httpx
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import time
-import schedule
 import smtplib
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
-from typing import List, Dict, Optional, Literal, Tuple
-from dataclasses import dataclass
+import re
+from typing import List, Dict, Iterable, Iterator, Optional, Literal, Tuple, Union
+from dataclasses import dataclass, field
 from enum import Enum
 
 load_dotenv()
 
+# API answers worth retrying with backoff
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Size of the chunks log files are streamed in
+_LOG_CHUNK_SIZE = 131072
+
+# Leading "<date> <time> INFO" timestamp of a log line
+_LOG_DATE_RE = re.compile(rb'^(\S+[ \t]+\S+)[ \t]+INFO', re.MULTILINE)
+
+# A parsed log timestamp, or its raw text when the format is not recognised
+LogDate = Union[datetime, str]
+
+def parse_log_date(value: str) -> Optional[LogDate]:
+    """Parse a log timestamp such as '2024-01-15 10:23:45,123'.
+
+    Timestamps in other formats are returned as text and ordered as strings.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip('[]').replace(',', '.'))
+    except ValueError:
+        return value
+
+def format_log_date(value: LogDate) -> str:
+    """Text form of a log date, as written to the last check files."""
+    return value.isoformat(sep=' ') if isinstance(value, datetime) else value
+
+def log_date_after(current: LogDate, last: LogDate) -> bool:
+    """Whether current is later than last, comparing as text unless both parsed."""
+    if isinstance(current, datetime) and isinstance(last, datetime):
+        return current > last
+    return format_log_date(current) > format_log_date(last)
+
+class PrettyJSON:
+    """Defers json.dumps(indent=2) until the value is actually printed."""
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, indent=2)
+
 class ControlPlane(str, Enum):
     US = "us"
     EU = "eu1"
@@ -37,6 +87,19 @@ class SearchPattern:
     search_string: str
     mail: List[str]
     app_name: str
+    _search_normalized: str = field(init=False, repr=False)
+    _search_first_token: bytes = field(init=False, repr=False)
+
+    def __post_init__(self):
+        tokens = self.search_string.split()
+        self._search_normalized = ' '.join(tokens)
+        self._search_first_token = tokens[0].encode('utf-8') if tokens else b''
+
+@dataclass
+class LastCheck:
+    date: Optional[LogDate] = None
+    offset: int = 0  # bytes of the log file already processed
+    lines: int = 0  # lines of the log file already processed
 
 @dataclass
 class SMTPConfig:
@@ -67,6 +130,8 @@ class LogMonitor:
         self.client_secret = os.getenv('MULESOFT_CLIENT_SECRET')
         self.check_interval = int(os.getenv('CHECK_INTERVAL_SECONDS', '300'))
         self.verbose_logging = os.getenv('VERBOSE_LOGGING', 'false').lower() == 'true'
+        self.max_concurrent_fetches = 8
+        self.alert_sample_limit = 50
         
         # Mulesoft Configuration
         control_plane_str = os.getenv('MULESOFT_CONTROL_PLANE', 'us').lower()
@@ -91,27 +156,79 @@ class LogMonitor:
             sender=os.getenv('SMTP_SENDER'),
         )
         
-        # Create last_check directory
+        # Blocking HTTP calls run on this pool; httpx.Client is safe to share
+        # across its threads, the alert queue and last check state use the lock
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_fetches,
+                                            thread_name_prefix='log-monitor')
+        self._state_lock = threading.Lock()
+        
+        # Alerts queued during a check and sent over one SMTP connection
+        self._pending_alerts: List[Tuple[List[str], str, str]] = []
+        
+        # HTTP/2 client shared by all Mulesoft API calls: concurrent log
+        # fetches are multiplexed over one connection to the control plane
+        self.http_retries = 3
+        limits = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        self.http = httpx.Client(http2=True, limits=limits, timeout=30.0)
+        
+        # OAuth token cache, reused until shortly before it expires
+        self._token: Optional[str] = None
+        self._token_exp = 0.0
+        self._token_lock = threading.Lock()
+        
+        # Create last_check directory and load the saved dates once
         os.makedirs("last_check", exist_ok=True)
+        self._last_check = self._load_last_checks()
+        self._last_check_dirty = set()
+        self._log_date_warned = False
         
         # Load search patterns from JSON file
         self.search_patterns = self._load_search_patterns()
+        self._patterns_by_app: Dict[str, List[SearchPattern]] = {}
+        for pattern in self.search_patterns:
+            self._patterns_by_app.setdefault(pattern.app_name, []).append(pattern)
+        self._matchers = {app_name: self._build_matcher(patterns)
+                          for app_name, patterns in self._patterns_by_app.items()}
+        # A line can only match if it contains some pattern's first token
+        self._prefilters = {app_name: tuple({p._search_first_token for p in patterns})
+                            for app_name, patterns in self._patterns_by_app.items()}
         
         self._validate_config()
 
-    def _verbose_log(self, message: str):
-        """Helper function for verbose logging."""
+    def _verbose_log(self, message: str, *args):
+        """Helper function for verbose logging.
+
+        Like logging, args are %-formatted into message only when verbose
+        logging is enabled, so callers should not pre-format with f-strings.
+        """
         if self.verbose_logging:
-            print(message)
+            print(message % args if args else message)
 
     def _load_search_patterns(self) -> List[SearchPattern]:
         patterns_file = os.getenv('PATTERNS_FILE', 'patterns.json')
         try:
-            with open(patterns_file, 'r') as f:
-                patterns_data = json.load(f)
-                return [SearchPattern(**pattern) for pattern in patterns_data]
+            with open(patterns_file, 'rb') as f:
+                patterns_data = orjson.loads(f.read())
+                patterns = [SearchPattern(**pattern) for pattern in patterns_data]
         except Exception as e:
             sys.exit(f"Error loading search patterns: {e}")
+        
+        empty = [f"{p.type} ({p.app_name})" for p in patterns if not p._search_normalized]
+        if empty:
+            sys.exit(f"Error loading search patterns: empty search_string for {', '.join(empty)}")
+        return patterns
+
+    def _build_matcher(self, patterns: List[SearchPattern]) -> ahocorasick.Automaton:
+        """Build an Aho-Corasick automaton matching all patterns of one application."""
+        by_search: Dict[str, List[SearchPattern]] = {}
+        for pattern in patterns:
+            by_search.setdefault(pattern._search_normalized, []).append(pattern)
+        
+        automaton = ahocorasick.Automaton()
+        for search_normalized, search_patterns in by_search.items():
+            automaton.add_word(search_normalized, (search_normalized, search_patterns))
+        automaton.make_automaton()
+        return automaton
 
     def _validate_config(self):
         required_vars = [
@@ -129,64 +246,153 @@ class LogMonitor:
         if missing:
             sys.exit(f"Missing required environment variables: {', '.join(missing)}")
 
-    def send_email(self, recipients: List[str], subject: str, body: str):
+    def _open_smtp(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.smtp_config.host, self.smtp_config.port)
+        try:
+            if self.smtp_config.use_tls:
+                server.starttls()
+            server.login(self.smtp_config.username, self.smtp_config.password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def send_email(self, server: smtplib.SMTP, recipients: List[str], subject: str, body: str):
+        msg = MIMEText(body, 'plain')
+        msg['From'] = self.smtp_config.sender
+        msg['To'] = ', '.join(recipients)
+        msg['Subject'] = subject
+
+        server.send_message(msg)
+        print(f"Email sent to {msg['To']}")
+
+    def _flush_alerts(self):
+        """Send all alerts queued during this check over a single SMTP connection."""
+        with self._state_lock:
+            alerts, self._pending_alerts = self._pending_alerts, []
+        if not alerts:
+            return
+        
         try:
-            for recipient in recipients:
-                msg = MIMEMultipart()
-                msg['From'] = self.smtp_config.sender
-                msg['To'] = recipient
-                msg['Subject'] = subject
-                msg.attach(MIMEText(body, 'plain'))
-
-                with smtplib.SMTP(self.smtp_config.host, self.smtp_config.port) as server:
-                    if self.smtp_config.use_tls:
-                        server.starttls()
-                    server.login(self.smtp_config.username, self.smtp_config.password)
-                    server.send_message(msg)
-                    print(f"Email sent to {recipient}")
+            server = self._open_smtp()
         except Exception as e:
             print(f"Error sending email: {e}")
+            return
+        
+        try:
+            for recipients, subject, body in alerts:
+                try:
+                    try:
+                        self.send_email(server, recipients, subject, body)
+                    except smtplib.SMTPServerDisconnected:
+                        server = self._open_smtp()
+                        self.send_email(server, recipients, subject, body)
+                except Exception as e:
+                    print(f"Error sending email: {e}")
+        finally:
+            try:
+                server.quit()
+            except smtplib.SMTPException:
+                pass
 
     def get_auth_token(self) -> str:
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret
-        }
-        try:
-            response = requests.post(self.mulesoft_config.auth_url, data=data)
-            self._verbose_log(f"Auth request URL: {self.mulesoft_config.auth_url}")
-            self._verbose_log(f"Auth request data: {data}")
+        with self._token_lock:
+            if self._token and time.monotonic() < self._token_exp:
+                return self._token
             
-            response.raise_for_status()
-            return response.json()["access_token"]
-        except requests.RequestException as e:
-            print(f"Auth request error: {e}")
-            if hasattr(e, 'response'):
-                print(f"Response status: {e.response.status_code}")
-            sys.exit(1)
+            data = {
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret
+            }
+            try:
+                response = self._send("POST", self.mulesoft_config.auth_url, data=data)
+                self._verbose_log("Auth request URL: %s", self.mulesoft_config.auth_url)
+                self._verbose_log("Auth request data: %s", data)
+                
+                response.raise_for_status()
+                token_data = orjson.loads(response.content)
+                self._token = token_data["access_token"]
+                # Refresh 60s ahead of the advertised expiry
+                self._token_exp = time.monotonic() + int(token_data.get("expires_in", 3600)) - 60
+                return self._token
+            except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+                print(f"Auth request error: {e}")
+                if hasattr(e, 'response'):
+                    print(f"Response status: {e.response.status_code}")
+                sys.exit(1)
+
+    def _invalidate_auth_token(self, auth_token: str):
+        """Drop the cached token if it is the one the API just rejected."""
+        with self._token_lock:
+            if self._token == auth_token:
+                self._token_exp = 0.0
+
+    def _send(self, method: str, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """Send a request, retrying connection errors and 429/5xx answers.
 
-    def get_instance_ids(self, app_name: str, auth_token: str) -> List[str]:
+        Waits follow the Retry-After header when the server sends one and
+        exponential backoff otherwise. With stream=True the body is not read
+        and the caller must close the response.
+        """
+        for attempt in range(self.http_retries + 1):
+            request = self.http.build_request(method, url, **kwargs)
+            try:
+                response = self.http.send(request, stream=stream)
+            except httpx.TransportError:
+                if attempt == self.http_retries:
+                    raise
+                time.sleep(0.3 * 2 ** attempt)
+                continue
+            if response.status_code not in _RETRY_STATUSES or attempt == self.http_retries:
+                return response
+            response.close()
+            time.sleep(self._retry_delay(response, attempt))
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        """Seconds to wait before retrying a 429/5xx answer."""
+        retry_after = response.headers.get('Retry-After', '').strip()
+        if retry_after and response.status_code in (429, 503):
+            if retry_after.isdigit():
+                return float(retry_after)
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+        return 0.3 * 2 ** attempt
+
+    def _api_get(self, url: str, headers: Dict[str, str], stream: bool = False) -> httpx.Response:
+        """GET against the Mulesoft API with the cached token, retrying once with a fresh one on 401."""
+        auth_token = self.get_auth_token()
+        response = self._send("GET", url, stream=stream, headers={**headers, 'Authorization': f'Bearer {auth_token}'})
+        if response.status_code == 401:
+            response.close()
+            self._verbose_log("Token rejected for %s, refreshing", url)
+            self._invalidate_auth_token(auth_token)
+            headers = {**headers, 'Authorization': f'Bearer {self.get_auth_token()}'}
+            response = self._send("GET", url, stream=stream, headers=headers)
+        return response
+
+    def get_instance_ids(self, app_name: str) -> List[str]:
         """Recupera gli ID di tutte le istanze dell'applicazione."""
         url = f"{self.mulesoft_config.base_url}/applications/{app_name}/deployments"
         headers = {
-            'Authorization': f'Bearer {auth_token}',
             'X-ANYPNT-ENV-ID': self.mulesoft_config.env_id,
             'X-ANYPNT-ORG-ID': self.mulesoft_config.org_id,
             'Content-Type': 'application/json'
         }
         
         try:
-            self._verbose_log(f"\nRequest URL: {url}")
-            self._verbose_log(f"Request headers: {json.dumps(headers, indent=2)}")
+            self._verbose_log("\nRequest URL: %s", url)
+            self._verbose_log("Request headers: %s", PrettyJSON(headers))
             
-            response = requests.get(url, headers=headers)
+            response = self._api_get(url, headers)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
-            if self.verbose_logging:
-                self._verbose_log(f"Response status: {response.status_code}")
-                self._verbose_log(f"Response data: {json.dumps(data, indent=2)}")
+            self._verbose_log("Response status: %s", response.status_code)
+            self._verbose_log("Response data: %s", PrettyJSON(data))
             
             # Prendi l'ultimo deployment
             last_deployment = data['data'][-1]
@@ -210,117 +416,313 @@ class LogMonitor:
                 f"/environments/{self.mulesoft_config.env_id}/applications/{app_name}"
                 f"/instances/{instance_id}/log-file")
 
-    def analyze_file(self, auth_token: str, pattern: SearchPattern) -> bool:
-        """Analizza i log di tutte le istanze dell'applicazione."""
-        try:
-            instance_ids = self.get_instance_ids(pattern.app_name, auth_token)
-            if not instance_ids:
-                print(f"No instances found for {pattern.app_name}")
-                return False
+    async def analyze_file(self, app_name: str, instance_ids: List[str],
+                           fetch_semaphore: Optional[asyncio.Semaphore] = None) -> bool:
+        """Analizza i log di tutte le istanze dell'applicazione.
 
-            found_matches = False
-            for instance_id in instance_ids:
-                log_url = self.get_log_url(pattern.app_name, instance_id)
-                last_check_date = self._get_last_check_date(pattern.app_name, instance_id)
-                
-                headers = {
-                    'Authorization': f'Bearer {auth_token}',
+        fetch_semaphore caps concurrent log downloads; a check shares one
+        across all applications.
+        """
+        loop = asyncio.get_running_loop()
+        if not instance_ids:
+            print(f"No instances found for {app_name}")
+            return False
+        if fetch_semaphore is None:
+            fetch_semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+
+        async def analyze_instance(instance_id: str) -> bool:
+            async with fetch_semaphore:
+                return await loop.run_in_executor(self._executor, self._analyze_instance, app_name, instance_id)
+
+        results = await asyncio.gather(*(analyze_instance(instance_id) for instance_id in instance_ids))
+        return any(results)
+
+    def _analyze_instance(self, app_name: str, instance_id: str) -> bool:
+        """Analizza i log di una singola istanza dell'applicazione."""
+        try:
+            log_url = self.get_log_url(app_name, instance_id)
+            last_check = self._get_last_check(app_name, instance_id)
+            last_check_date = last_check.date if last_check else None
+            offset = last_check.offset if last_check else 0
+            lines = last_check.lines if last_check else 0
+            
+            headers = {
                     'X-ANYPNT-ENV-ID': self.mulesoft_config.env_id,
-                    'X-ANYPNT-ORG-ID': self.mulesoft_config.org_id,
-                    'Content-Type': 'application/json'
-                }
-                
-                self._verbose_log(f"\nFetching logs from: {log_url}")
-                self._verbose_log(f"Using headers: {json.dumps(headers, indent=2)}")
-                
-                response = requests.get(log_url, headers=headers, stream=True)
+                'X-ANYPNT-ORG-ID': self.mulesoft_config.org_id,
+                'Content-Type': 'application/json',
+                # Text logs compress well; httpx inflates the stream transparently
+                'Accept-Encoding': 'gzip, deflate'
+            }
+            if offset:
+                # Only ask for data past what was already processed, starting at
+                # the newline that ends it so the resume can be checked; on a
+                # compressed response the range would address the gzip body
+                # rather than the log file, so skip compression here
+                headers['Range'] = f'bytes={offset - 1}-'
+                headers['Accept-Encoding'] = 'identity'
+            
+            self._verbose_log("\nFetching logs from: %s", log_url)
+            self._verbose_log("Using headers: %s", PrettyJSON(headers))
+            
+            response = self._api_get(log_url, headers, stream=True)
+            chunks = None
+            if response.status_code == 206:
+                chunks = self._iter_resumed_chunks(response, offset)
+            if response.status_code == 416 or (response.status_code == 206 and chunks is None):
+                # Log file no longer continues the processed data (e.g. rotated), read it again
+                response.close()
+                self._verbose_log("Saved offset %d does not match the log, fetching whole file", offset)
+                del headers['Range']
+                headers['Accept-Encoding'] = 'gzip, deflate'
+                response = self._api_get(log_url, headers, stream=True)
+            
+            try:
+                if response.is_error:
+                    response.read()  # keep the body for the error output below
                 response.raise_for_status()
                 
-                worker_match = self._process_log_stream(response, last_check_date, pattern, instance_id)
-                print(f"  » {instance_id} (from: {last_check_date or 'start'}) -> {'Match' if worker_match else 'No Match'}")
-                if worker_match:
-                    found_matches = True
-                
-            return found_matches
+                # Servers ignoring Range answer 200 with the whole file
+                if chunks is not None and response.status_code == 206:
+                    worker_match = self._process_log_stream(chunks, last_check_date, app_name, instance_id,
+                                                            offset, lines)
+                else:
+                    worker_match = self._process_log_stream(response.iter_bytes(chunk_size=_LOG_CHUNK_SIZE),
+                                                            last_check_date, app_name, instance_id)
+            finally:
+                response.close()
+            print(f"  » {app_name}/{instance_id} (from: {last_check_date or 'start'}) -> {'Match' if worker_match else 'No Match'}")
+            return worker_match
                 
-        except requests.RequestException as e:
-            print(f"Request error for {pattern.app_name}: {e}")
+        except httpx.HTTPError as e:
+            print(f"Request error for {app_name}/{instance_id}: {e}")
             if hasattr(e, 'response') and self.verbose_logging:
                 print(f"Response status: {e.response.status_code}")
                 print(f"Response body: {e.response.text}")
             return False
 
-    def _get_last_check_date(self, app_name: str, instance_id: str) -> Optional[str]:
-        """Get last check date for specific application instance."""
-        filename = f'last_check/{app_name}_{instance_id}.txt'
-        try:
+    def _iter_resumed_chunks(self, response: httpx.Response, offset: int) -> Optional[Iterator[bytes]]:
+        """Chunks of a 206 answer past offset, or None if it does not continue the processed log.
+
+        The range starts at offset - 1, the newline ending the processed data:
+        another start or byte there means the log was replaced since.
+        """
+        match = re.match(r'\s*bytes\s+(\d+)-', response.headers.get('Content-Range', ''))
+        if not match or int(match.group(1)) != offset - 1:
+            return None
+        chunks = response.iter_bytes(chunk_size=_LOG_CHUNK_SIZE)
+        first = next(chunks, b'')
+        if first[:1] != b'\n':
+            return None
+        return itertools.chain((first[1:],), chunks)
+
+    def _load_last_checks(self) -> Dict[str, LastCheck]:
+        """Load all saved last check positions from the last_check directory.
+
+        Each file holds the last processed log date and, on the following
+        lines, the byte offset and line count reached in the log file.
+        """
+        last_checks = {}
+        for filename in glob.glob('last_check/*.txt'):
+            key = os.path.splitext(os.path.basename(filename))[0]
             with open(filename, 'r') as f:
-                return f.read().strip()
-        except FileNotFoundError:
+                lines = f.read().splitlines()
+            last_date = parse_log_date(lines[0]) if lines else None
+            offset = int(lines[1]) if len(lines) > 1 and lines[1].strip().isdigit() else 0
+            line_count = int(lines[2]) if len(lines) > 2 and lines[2].strip().isdigit() else 0
+            if last_date or offset:
+                last_checks[key] = LastCheck(last_date, offset, line_count)
+            else:
+                print(f"Ignoring unreadable last check in {filename}")
+        return last_checks
+
+    def _get_last_check(self, app_name: str, instance_id: str) -> Optional[LastCheck]:
+        """Get last check position for specific application instance."""
+        return self._last_check.get(f'{app_name}_{instance_id}')
+
+    def _save_last_check(self, app_name: str, instance_id: str, last_check: LastCheck):
+        """Save last check position for specific application instance (written on flush)."""
+        key = f'{app_name}_{instance_id}'
+        if not (last_check.date or last_check.offset):
+            return
+        with self._state_lock:
+            if self._last_check.get(key) != last_check:
+                self._last_check[key] = last_check
+                self._last_check_dirty.add(key)
+
+    def _flush_last_check(self):
+        """Write the last check positions changed during this cycle to disk."""
+        with self._state_lock:
+            dirty = {key: self._last_check[key] for key in self._last_check_dirty}
+            self._last_check_dirty = set()
+        for key, last_check in dirty.items():
+            filename = f'last_check/{key}.txt'
+            try:
+                with open(f'{filename}.tmp', 'w') as f:
+                    f.write(format_log_date(last_check.date) if last_check.date else '')
+                    f.write(f'\n{last_check.offset}\n{last_check.lines}')
+                os.replace(f'{filename}.tmp', filename)
+            except OSError as e:
+                print(f"Error saving last check for {key}: {e}")
+                with self._state_lock:
+                    self._last_check_dirty.add(key)
+
+    def _iter_log_blocks(self, chunks: Iterable[bytes], hold_tail: bool):
+        """Yield (block, complete) pairs of raw log lines (bytes, without the final newline).
+
+        A trailing line without newline is still being written: it comes last
+        with complete False, or not at all with hold_tail, so that the saved
+        offset always ends on a line boundary.
+        """
+        buffer = b''
+        for chunk in chunks:
+            buffer += chunk
+            last_newline = buffer.rfind(b'\n')
+            if last_newline == -1:
+                continue
+            yield buffer[:last_newline], True
+            buffer = buffer[last_newline + 1:]
+        if buffer and not hold_tail:
+            yield buffer, False
+
+    def _parse_log_date(self, value: bytes) -> Optional[LogDate]:
+        """Parse a timestamp taken from a log line, warning once about unknown formats."""
+        log_date = parse_log_date(value.decode('ascii', 'replace'))
+        if isinstance(log_date, str) and not self._log_date_warned:
+            self._log_date_warned = True
+            print(f"Unrecognised log timestamp '{log_date}', comparing log dates as text")
+        return log_date
+
+    def _date_before(self, block: bytes, pos: int, stop: int = 0) -> Optional[LogDate]:
+        """Timestamp of the closest dated line starting at or before pos in block.
+
+        Only lines starting at or after stop (a line start) are looked at.
+        """
+        while pos >= stop:
+            line_start = block.rfind(b'\n', max(stop - 1, 0), pos) + 1
+            date_match = _LOG_DATE_RE.match(block, line_start)
+            if date_match:
+                current_date = self._parse_log_date(date_match.group(1))
+                if current_date:
+                    return current_date
+            pos = line_start - 1
+        return None
+
+    def _find_check_start(self, block: bytes, last_check_date: LogDate) -> Optional[int]:
+        """Offset of the first line in block dated after last_check_date, if any.
+
+        Log timestamps are increasing, so a block whose last date is not newer
+        than last_check_date is skipped without visiting its lines.
+        """
+        block_date = self._date_before(block, len(block))
+        if block_date is None or not log_date_after(block_date, last_check_date):
             return None
+        for date_match in _LOG_DATE_RE.finditer(block):
+            current_date = self._parse_log_date(date_match.group(1))
+            if current_date and log_date_after(current_date, last_check_date):
+                return date_match.start()
+        return None
 
-    def _save_last_check_date(self, app_name: str, instance_id: str, last_date: str):
-        """Save last check date for specific application instance."""
-        filename = f'last_check/{app_name}_{instance_id}.txt'
-        with open(filename, 'w') as f:
-            f.write(last_date)
-
-    def _process_log_stream(self, response, last_check_date: Optional[str], pattern: SearchPattern, instance_id: str) -> bool:
-        total_size = 0
-        total_lines = 0
-        last_date = None
-        start_checking = last_check_date is None
-        pattern_found = False
+    def _find_candidate_lines(self, block: bytes, start: int, tokens: Tuple[bytes, ...]) -> List[int]:
+        """Start offsets of the lines in block[start:] containing any of the tokens."""
+        line_starts = set()
+        for token in tokens:
+            pos = block.find(token, start)
+            while pos != -1:
+                line_starts.add(block.rfind(b'\n', 0, pos) + 1)
+                line_end = block.find(b'\n', pos)
+                if line_end == -1:
+                    break
+                pos = block.find(token, line_end + 1)
+        return sorted(line_starts)
+
+    def _process_log_stream(self, chunks: Iterable[bytes], last_check_date: Optional[LogDate], app_name: str,
+                            instance_id: str, offset: int = 0, lines: int = 0) -> bool:
+        line_base = lines  # lines of the file before the current block
+        last_date = last_check_date
+        # A ranged response only contains data past the last check
+        start_checking = last_check_date is None or offset > 0
+        # An unterminated last line is scanned now unless the next check
+        # resumes from the offset; a whole-file read filters by date and
+        # would skip it as old
+        hold_tail = offset > 0
+        matcher = self._matchers[app_name]
+        prefilter = self._prefilters[app_name]
+        # Sample matches and counts per pattern, reported in one alert once the stream is done
+        matches: Dict[int, Tuple[SearchPattern, List[Tuple[int, Optional[LogDate], str]]]] = {}
+        match_counts: Dict[int, int] = {}
         
-        for line_number, line in enumerate(response.iter_lines(decode_unicode=True), 1):
-            if not line:  # Skip empty lines
-                continue
-                
-            total_size += len(line.encode('utf-8'))
-            total_lines = line_number
+        # Whole blocks are searched with C-level bytes/regex scans; only lines
+        # containing a pattern token (and the dated lines before them) are
+        # visited from Python
+        for block, complete in self._iter_log_blocks(chunks, hold_tail):
+            if complete:
+                offset += len(block) + 1
             
-            try:
-                if "INFO" in line:
-                    current_date = self._extract_date(line)
-                    if current_date:
-                        last_date = current_date
-                        if not start_checking and current_date > last_check_date:
-                            start_checking = True
-                
-                if start_checking:
-                    if self._check_pattern(line, line_number, last_date, pattern, instance_id):
-                        pattern_found = True
+            scan_from = 0
+            if not start_checking:
+                scan_from = self._find_check_start(block, last_check_date)
+                start_checking = scan_from is not None
+            
+            if start_checking:
+                # Line count and date are carried forward from one candidate
+                # to the next, so each part of the block is scanned once
+                cursor = scan_from
+                cursor_line = block.count(b'\n', 0, scan_from)
+                cursor_date = last_date
+                for line_start in self._find_candidate_lines(block, scan_from, prefilter):
+                    line_end = block.find(b'\n', line_start)
+                    raw_line = block[line_start:line_end if line_end != -1 else len(block)].rstrip(b'\r')
+                    if not raw_line:  # Skip empty lines
+                        continue
                     
-            except Exception as e:
-                self._verbose_log(f"Error processing line {line_number}: {e}")
-                continue
+                    try:
+                        line = raw_line.decode('utf-8', 'replace')
+                        found = self._check_patterns(matcher, line)
+                    except Exception as e:
+                        line_number = line_base + cursor_line + block.count(b'\n', cursor, line_start) + 1
+                        print(f"Error processing line {line_number} of {app_name}/{instance_id}: {e}")
+                        continue
+                    if not found:
+                        continue
+                    
+                    cursor_line += block.count(b'\n', cursor, line_start)
+                    cursor_date = self._date_before(block, line_start, cursor) or cursor_date
+                    cursor = line_start
+                    line_number = line_base + cursor_line + 1
+                    current_date = cursor_date
+                    for pattern in found:
+                        print(f"  » Match found [{pattern.type}]: {line}")
+                        samples = matches.setdefault(id(pattern), (pattern, []))[1]
+                        if len(samples) < self.alert_sample_limit:
+                            samples.append((line_number, current_date, line))
+                        match_counts[id(pattern)] = match_counts.get(id(pattern), 0) + 1
+            
+            last_date = self._date_before(block, len(block)) or last_date
+            
+            if complete:
+                line_base += block.count(b'\n') + 1
         
-        if last_date:
-            self._save_last_check_date(pattern.app_name, instance_id, last_date)
+        self._save_last_check(app_name, instance_id, LastCheck(last_date, offset, line_base))
+        
+        for key, (pattern, samples) in matches.items():
+            self._send_batched_alert(pattern, instance_id, samples, total=match_counts[key])
             
-        return pattern_found
-
-    def _extract_date(self, line: str) -> Optional[str]:
-        parts = line.split("INFO", 1)
-        if parts and len(parts[0].strip().split()) >= 1:
-            return parts[0].strip()
-        return None
+        return bool(matches)
 
-    def _check_pattern(self, line: str, line_number: int, current_date: str, 
-                      pattern: SearchPattern, instance_id: str) -> bool:
+    def _check_patterns(self, matcher: ahocorasick.Automaton, line: str) -> List[SearchPattern]:
         line_normalized = ' '.join(line.split())
-        search_normalized = ' '.join(pattern.search_string.split())
-        
-        if search_normalized in line_normalized:
-            self._handle_pattern_match(pattern, line, line_number, current_date, instance_id)
-            return True
-        return False
-
-    def _handle_pattern_match(self, pattern: SearchPattern, line: str, line_number: int, 
-                            current_date: str, instance_id: str):
-        print(f"  » Match found [{pattern.type}]: {line}")
         
-        subject = f"Log Alert: {pattern.type} - {pattern.app_name}"
+        matched = {}
+        for _, (search_normalized, patterns) in matcher.iter(line_normalized):
+            matched[search_normalized] = patterns
+        return [pattern for patterns in matched.values() for pattern in patterns]
+
+    def _send_batched_alert(self, pattern: SearchPattern, instance_id: str,
+                            matches: List[Tuple[int, Optional[LogDate], str]], total: int):
+        """Queue one alert summarizing all matches of a pattern on a worker."""
+        subject = f"Log Alert: {pattern.type} - {pattern.app_name} ({total} matches)"
+        entries = "\n".join(f"[{current_date}] line {line_number}: {line}"
+                            for line_number, current_date, line in matches)
         body = f"""
 Alert Details:
 Application: {pattern.app_name}
@@ -329,24 +731,40 @@ Control Plane: {self.mulesoft_config.control_plane.value}
 Environment: {self.mulesoft_config.env_id}
 Type: {pattern.type}
 Pattern: {pattern.search_string}
+Matches: {total}
 
-Log Entry:
-{line}
-
-Time: {current_date}
+Log Entries (showing {len(matches)} of {total}):
+{entries}
 """
-        self.send_email(pattern.mail, subject, body)
+        with self._state_lock:
+            self._pending_alerts.append((pattern.mail, subject, body))
 
-    def check_files(self):
-        """Check logs for all configured applications."""
+    async def _monitor_app(self, index: int, total_apps: int, app_name: str,
+                           fetch_semaphore: asyncio.Semaphore) -> bool:
+        loop = asyncio.get_running_loop()
+        instance_ids = await loop.run_in_executor(self._executor, self.get_instance_ids, app_name)
+        print(f"\nApplication {index}/{total_apps} - Monitoring {app_name} "
+              f"[{len(instance_ids)} workers, {len(self._patterns_by_app[app_name])} patterns]")
+        return await self.analyze_file(app_name, instance_ids, fetch_semaphore)
+
+    async def check_files_async(self):
+        """Check logs for all configured applications concurrently."""
         try:
-            auth_token = self.get_auth_token()
-            found_matches = False
-            total_patterns = len(self.search_patterns)
+            loop = asyncio.get_running_loop()
+            fetch_semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+            # Authenticate before fanning out; API calls then reuse the cached token
+            await loop.run_in_executor(self._executor, self.get_auth_token)
+            app_names = list(self._patterns_by_app)
             
-            for index, pattern in enumerate(self.search_patterns, 1):
-                print(f"\nPattern {index}/{total_patterns} - Monitoring {pattern.app_name} [{len(self.get_instance_ids(pattern.app_name, auth_token))} workers]")
-                if self.analyze_file(auth_token, pattern):
+            tasks = [self._monitor_app(index, len(app_names), app_name, fetch_semaphore)
+                     for index, app_name in enumerate(app_names, 1)]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            found_matches = False
+            for app_name, result in zip(app_names, results):
+                if isinstance(result, Exception):
+                    print(f"Error checking {app_name}: {result}")
+                elif result:
                     found_matches = True
             
             print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Check completed - New matches: {'Yes' if found_matches else 'No'}")
@@ -355,32 +773,41 @@ Time: {current_date}
             if hasattr(e, '__traceback__') and self.verbose_logging:
                 import traceback
                 traceback.print_exc()
+        finally:
+            self._flush_last_check()
+            self._flush_alerts()
 
+    def check_files(self):
+        """Check logs for all configured applications."""
+        asyncio.run(self.check_files_async())
 
-    def run(self):
-        """Start the monitoring process"""
-        print(f"\nMulesoft Log Monitor started")
-        print(f"Control Plane: {self.mulesoft_config.control_plane.value}")
-        print(f"Environment: {self.mulesoft_config.env_id}")
-        print(f"Check interval: {self.check_interval}s")
-        print(f"Applications: {', '.join(p.app_name for p in self.search_patterns)}\n")
-        
-        self.check_files()  # Initial check
-        schedule.every(self.check_interval).seconds.do(self.check_files)
-        
+    async def _periodic(self):
+        """Run a check, then wait check_interval seconds before the next one."""
         while True:
             try:
-                schedule.run_pending()
-                time.sleep(1)
-            except KeyboardInterrupt:
-                print("\nStopping monitor...")
-                break
+                await self.check_files_async()
             except Exception as e:
                 print(f"Error in main loop: {e}")
                 if hasattr(e, '__traceback__'):
                     import traceback
                     traceback.print_exc()
-                time.sleep(self.check_interval)
+            await asyncio.sleep(self.check_interval)
+
+    def run(self):
+        """Start the monitoring process"""
+        print(f"\nMulesoft Log Monitor started")
+        print(f"Control Plane: {self.mulesoft_config.control_plane.value}")
+        print(f"Environment: {self.mulesoft_config.env_id}")
+        print(f"Check interval: {self.check_interval}s")
+        print(f"Applications: {', '.join(self._patterns_by_app)}\n")
+        
+        try:
+            asyncio.run(self._periodic())
+        except KeyboardInterrupt:
+            print("\nStopping monitor...")
+        finally:
+            self._executor.shutdown(wait=False)
+            self.http.close()
 
 def main():
     try: